@@ -0,0 +1,145 @@
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pm_analysis.chunking import (
+    THINGSPEAK_RESULT_CAP,
+    TruncatedWindowError,
+    adaptive_chunks,
+)
+from pm_analysis.ledger import ChunkLedger, backfill, hourly_means
+
+# Offline checks of the backfill logic in data_fetch.py against a stub
+# ThingSpeak, run with `python check_backfill.py`. No network access needed.
+
+start = datetime(2025, 4, 1)
+end = datetime(2025, 6, 1)
+hours = int((end - start) / timedelta(hours=1))
+
+
+class StubThingSpeak:
+    """Returns ``per_hour`` entries per hour, capped like ThingSpeak.
+
+    Entries are posted on a fixed grid from ``start``. Like ThingSpeak,
+    both ends of the window are inclusive. Each entry's ``pm25`` is its time
+    in hours since ``start``.
+    """
+
+    def __init__(self, per_hour, fail=()):
+        self.per_hour = per_hour
+        self.fail = set(fail)
+        self.requests = []
+
+    def __call__(self, window_start, window_end):
+        self.requests.append((window_start, window_end))
+        if window_start in self.fail:
+            raise ConnectionError(f"stub failure at {window_start}")
+        step = timedelta(hours=1) / self.per_hour
+        first = start - (start - window_start) // step * step
+        times = pd.date_range(first, window_end, freq=step)
+        times = times[:THINGSPEAK_RESULT_CAP]
+        return pd.DataFrame(
+            {
+                "timestamp": times,
+                "pm25": (times - start) / timedelta(hours=1),
+            }
+        )
+
+
+def check_split_on_cap():
+    # 200 entries an hour: the first 3-day window returns a full 8000
+    stub = StubThingSpeak(per_hour=200)
+    windows = list(adaptive_chunks(stub, start, end))
+    assert stub.requests[0] == (start, start + timedelta(days=3))
+    assert stub.requests[1] == (start, start + timedelta(days=1.5))
+    assert windows[0][:2] == stub.requests[1]
+    assert all(len(df) < THINGSPEAK_RESULT_CAP for *_, df in windows)
+
+    # Hour h holds the 200 entries of [h, h + 1), boundary entries once
+    hourly = hourly_means((df for *_, df in windows), ["pm25"])
+    assert len(hourly) == hours + 1
+    expected = hourly["timestamp"].sub(start) / timedelta(hours=1)
+    expected[:-1] += 199 / 400
+    assert (hourly["pm25"] - expected).abs().max() < 1e-9
+
+
+def check_truncated_smallest_window():
+    # Over 8000 entries an hour: even a 1-hour window is truncated
+    stub = StubThingSpeak(per_hour=10000)
+    try:
+        list(adaptive_chunks(stub, start, start + timedelta(hours=4)))
+    except TruncatedWindowError as error:
+        assert error.window == (start, start + timedelta(hours=1))
+    else:
+        raise AssertionError("truncated window was returned as complete")
+
+
+def check_growth_on_sparse_channel():
+    # One entry an hour: windows grow until one request covers the rest
+    stub = StubThingSpeak(per_hour=1)
+    windows = list(adaptive_chunks(stub, start, end))
+    widths = [
+        window_end - window_start for window_start, window_end, _ in windows
+    ]
+    assert widths[1] > widths[0]
+    assert len(stub.requests) == len(windows) <= 3
+    assert windows[-1][1] == end
+
+
+def check_failed_window_retried(root):
+    failing_start = start + timedelta(days=3)
+
+    ledger = ChunkLedger(root)
+    stub = StubThingSpeak(per_hour=1, fail=[failing_start])
+    backfill(ledger, "n1", stub, start, end)
+    failed = ledger.failed()
+    assert len(failed) == 1
+    # The window recorded is exactly the request that raised
+    failed_request = [r for r in stub.requests if r[0] == failing_start][0]
+    assert (failed[0]["start"], failed[0]["end"]) == tuple(
+        t.strftime("%Y-%m-%d %H:%M:%S") for t in failed_request
+    )
+    assert ledger.pending() == []
+    assert ledger.missing("n1", start, end) == [failed_request]
+
+    # The next run, from the ledger on disk, fetches only the failed window
+    ledger = ChunkLedger(root)
+    stub = StubThingSpeak(per_hour=1)
+    backfill(ledger, "n1", stub, start, end)
+    assert stub.requests[0][0] == failed_request[0]
+    assert stub.requests[-1][1] == failed_request[1]
+    assert ledger.failed() == []
+    assert ledger.missing("n1", start, end) == []
+    hourly = hourly_means(ledger.read_chunks("n1", start, end), ["pm25"])
+    assert len(hourly) == hours + 1
+
+
+def check_other_errors_not_swallowed(root):
+    # An error outside the request, e.g. writing a chunk, is not a failed
+    # window and must reach the caller unchanged
+    ledger = ChunkLedger(root)
+
+    def mark_done(*args):
+        raise OSError("disk full")
+
+    ledger.mark_done = mark_done
+    try:
+        backfill(ledger, "n1", StubThingSpeak(per_hour=1), start, end)
+    except OSError as error:
+        assert str(error) == "disk full"
+    else:
+        raise AssertionError("OSError was swallowed")
+
+
+check_split_on_cap()
+check_growth_on_sparse_channel()
+check_truncated_smallest_window()
+with tempfile.TemporaryDirectory() as root:
+    check_failed_window_retried(root)
+with tempfile.TemporaryDirectory() as root:
+    check_other_errors_not_swallowed(root)
+print("All backfill checks passed")
@@ -1,3 +1,5 @@
+import os
+import sys
 import pandas as pd
 import requests
 from datetime import datetime, timedelta
@@ -6,6 +8,17 @@ import concurrent.futures
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pm_analysis.dataset import write_partitions
+from pm_analysis.ledger import ChunkLedger, backfill, hourly_means
+
+# Hourly readings partitioned by channel and month, see pm_analysis/dataset.py
+partition_root = "thingspeak"
+
+# Chunk status and fetched chunks, see pm_analysis/ledger.py. Delete this
+# folder to start a backfill from scratch.
+ledger_root = "backfill"
+
 end_date = datetime(2025, 6, 1)
 start_date = datetime(2025, 4, 1)
 
@@ -40,36 +53,37 @@ def fetch_channel_data(channel_id, api_key, start_str, end_str, channel_name):
     )
     session.mount("https://", HTTPAdapter(max_retries=retries))
 
-    url = f"https://api.thingspeak.com/channels/{channel_id}/feeds.json?api_key={api_key}&start={start_str}&end={end_str}&timescale=60"
+    # Raw entries, so the response count shows when the 8000-entry cap is
+    # hit. They are averaged to hours when the table is built below.
+    url = f"https://api.thingspeak.com/channels/{channel_id}/feeds.json?api_key={api_key}&start={start_str}&end={end_str}"
+    # Errors are raised so the chunk is marked failed and retried next run
     try:
         response = session.get(url, timeout=30)
-        if response.status_code == 200:
-            data = response.json()
-            if "feeds" in data and data["feeds"]:
-                df = pd.DataFrame(data["feeds"])
-                df["channel"] = channel_name
-                df["timestamp"] = pd.to_datetime(
-                    df["created_at"]
-                ).dt.tz_localize(None)
-                for field, metric in field_mapping.items():
-                    if field in df.columns:
-                        df[metric] = pd.to_numeric(df[field], errors="coerce")
-                return df[
-                    ["timestamp", "channel"]
-                    + [m for m in field_mapping.values() if m in df.columns]
-                ]
-            print(f"No data for {channel_name} in this period")
-            return pd.DataFrame()
-        print(f"Error {response.status_code} for {channel_name}")
-        return pd.DataFrame()
-    except Exception as e:
-        print(f"Exception for {channel_name}: {str(e)}")
+        if response.status_code != 200:
+            raise requests.HTTPError(
+                f"Error {response.status_code} for {channel_name}"
+            )
+        data = response.json()
+        if "feeds" in data and data["feeds"]:
+            df = pd.DataFrame(data["feeds"])
+            df["channel"] = channel_name
+            df["timestamp"] = pd.to_datetime(df["created_at"]).dt.tz_localize(
+                None
+            )
+            for field, metric in field_mapping.items():
+                if field in df.columns:
+                    df[metric] = pd.to_numeric(df[field], errors="coerce")
+            return df[
+                ["timestamp", "channel"]
+                + [m for m in field_mapping.values() if m in df.columns]
+            ]
+        print(f"No data for {channel_name} in this period")
         return pd.DataFrame()
     finally:
         session.close()
 
 
-all_hours = pd.date_range(start=start_date, end=end_date, freq="H")
+all_hours = pd.date_range(start=start_date, end=end_date, freq="h")
 template_df = pd.DataFrame(
     {
         "timestamp": all_hours,
@@ -79,64 +93,94 @@ template_df = pd.DataFrame(
     }
 )
 
+# First request window of each run. Later windows are sized from the
+# number of entries each response returned, and split when a response hits
+# ThingSpeak's 8000-entry cap, see pm_analysis/chunking.py
 chunk_size = timedelta(days=3)
-current_start = start_date
-all_data = []
-
-while current_start < end_date:
-    current_end = min(current_start + chunk_size, end_date)
-    start_str = current_start.strftime("%Y-%m-%d%%20%H:%M:%S")
-    end_str = current_end.strftime("%Y-%m-%d%%20%H:%M:%S")
-
-    print(f"Processing {current_start} to {current_end}")
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
-        future_to_channel = {
-            executor.submit(
-                fetch_channel_data,
-                channel["id"],
-                channel["api_key"],
-                start_str,
-                end_str,
-                f"n{i+1}",
-            ): f"n{i+1}"
-            for i, channel in enumerate(channels)
-        }
-
-        for future in concurrent.futures.as_completed(future_to_channel):
-            channel_name = future_to_channel[future]
-            try:
-                df = future.result()
-                if not df.empty:
-                    all_data.append(df)
-                time.sleep(0.5)
-            except Exception as e:
-                print(f"Error processing {channel_name}: {str(e)}")
-
-    current_start = current_end
-
-
-if all_data:
-    combined_df = pd.concat(all_data, ignore_index=True)
-
-    combined_df["hour_timestamp"] = combined_df["timestamp"].dt.round("H")
-
-    result_df = template_df.copy()
-    for i, channel in enumerate(channels):
-        channel_name = f"n{i+1}"
-        channel_data = combined_df[combined_df["channel"] == channel_name]
-
-        for metric in channel["metrics"]:
-            metric_data = (
-                channel_data.groupby(channel_data["hour_timestamp"])[metric]
-                .mean()
-                .reset_index()
-            )
-            metric_data.columns = ["timestamp", f"{channel_name}-{metric}"]
-            result_df = pd.merge(
-                result_df, metric_data, on="timestamp", how="left"
-            )
+max_chunk_size = timedelta(days=90)
+channel_by_name = {f"n{i+1}": channel for i, channel in enumerate(channels)}
+
+ledger = ChunkLedger(ledger_root)
+
+
+# Fetch everything of one channel that no earlier run has fetched yet
+def backfill_channel(channel_name):
+    channel = channel_by_name[channel_name]
+
+    def fetch(window_start, window_end):
+        start_str = window_start.strftime("%Y-%m-%d%%20%H:%M:%S")
+        end_str = window_end.strftime("%Y-%m-%d%%20%H:%M:%S")
+        print(f"Processing {channel_name}: {window_start} to {window_end}")
+        df = fetch_channel_data(
+            channel["id"], channel["api_key"], start_str, end_str, channel_name
+        )
+        time.sleep(0.5)
+        return df
+
+    def report(window_start, window_end, error):
+        # The window is marked failed and retried on the next run
+        print(
+            f"Error processing {channel_name} {window_start} to {window_end}: "
+            f"{str(error)}"
+        )
+
+    backfill(
+        ledger,
+        channel_name,
+        fetch,
+        start_date,
+        end_date,
+        on_error=report,
+        initial=chunk_size,
+        max_size=max_chunk_size,
+    )
+
+
+with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+    futures = [
+        executor.submit(backfill_channel, channel_name)
+        for channel_name in channel_by_name
+    ]
+    for future in concurrent.futures.as_completed(futures):
+        future.result()
+
+failed = ledger.failed() + ledger.pending()
+if failed:
+    print(
+        f"{len(failed)} chunk(s) failed and will be retried on the next run"
+    )
+
+
+# Build the hourly table one channel at a time from the stored chunks,
+# reading one chunk at a time
+result_df = template_df.copy()
+has_data = False
+for channel_name, channel in channel_by_name.items():
+    hourly_data = hourly_means(
+        ledger.read_chunks(channel_name, start_date, end_date),
+        channel["metrics"],
+    )
+    if hourly_data.empty:
+        continue
+    has_data = True
+    metrics = [m for m in channel["metrics"] if m in hourly_data.columns]
+
+    write_partitions(
+        hourly_data.round({m: 3 for m in metrics}).assign(channel=channel_name),
+        partition_root,
+    )
+
+    result_df = pd.merge(
+        result_df,
+        hourly_data.rename(
+            columns={m: f"{channel_name}-{m}" for m in metrics}
+        ),
+        on="timestamp",
+        how="left",
+    )
+
 
+if has_data:
     result_df["UTC"] = result_df.apply(
         lambda row: f"{int(row['month'])}/{int(row['day'])}/{end_date.year} {int(row['hour'])}:00:00",
         axis=1,
@@ -1,144 +1,171 @@
+import os
+import sys
 import pandas as pd
-import scipy.stats as stats
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy.stats import kstest
-from matplotlib.font_manager import FontProperties
 
-# Font settings
-csfont = {"fontname": "Times New Roman"}
-legend_font = FontProperties(family="Times New Roman")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# matplotlib, seaborn and scipy are imported inside the functions that use
+# them, so the statistics can run without loading the plotting stack.
+
 
 # Load data
-try:
-    df = pd.read_csv(
-        "resources/thingspeak_data_april_to_june_cleaned_outVSin.csv"
-    )
-except FileNotFoundError:
-    print("Error: CSV file not found. Please check the file path.")
-    exit()
-
-# Check if required columns exist
-required_columns = ["n1-pm10", "n1-pm25", "n2-pm10", "n2-pm25"]
-if not all(col in df.columns for col in required_columns):
-    missing_cols = [col for col in required_columns if col not in df.columns]
-    print(
-        f"Error: CSV must contain columns: {required_columns}. Missing: {missing_cols}"
-    )
-    exit()
-
-# Check if DataFrame is empty
-if df.empty:
-    print("Error: CSV file is empty.")
-    exit()
-
-# Remove rows where any of n1-pm10, n1-pm25, n2-pm10, or n2-pm25 exceed 20 µg/m³
-outlier_condition = (
-    (df["n1-pm10"] > 20)
-    | (df["n1-pm25"] > 20)
-    | (df["n2-pm10"] > 20)
-    | (df["n2-pm25"] > 20)
-)
-outlier_count = len(df[outlier_condition])
-df = df[~outlier_condition]
-print(
-    f"Removed {outlier_count} row(s) where n1-pm10, n1-pm25, n2-pm10, or n2-pm25 > 20 µg/m³"
-)
-
-# Check if data remains after outlier removal
-if df.empty:
-    print("Error: No data remains after removing outliers.")
-    exit()
-
-# Rename columns
-df = df.rename(
-    columns={
-        "n1-pm10": "Внатрешен сензор (PM10)",
-        "n2-pm10": "Надворешен сензор (PM10)",
-        "n1-pm25": "Внатрешен сензор (PM2.5)",
-        "n2-pm25": "Надворешен сензор (PM2.5)",
-    }
-)
-
-# Statistical comparisons
-comparisons = [
-    (
-        df["Надворешен сензор (PM10)"].dropna(),
-        df["Внатрешен сензор (PM10)"].dropna(),
-        "Надворешен сензор (PM10)",
-        "Внатрешен сензор (PM10)",
-        "pm10: Outside vs Inside",
-    ),
-    (
-        df["Надворешен сензор (PM2.5)"].dropna(),
-        df["Внатрешен сензор (PM2.5)"].dropna(),
-        "Надворешен сензор (PM2.5)",
-        "Внатрешен сензор (PM2.5)",
-        "pm25: Outside vs Inside",
-    ),
-]
-
-print("Normality and Variance Checks, Statistical Test Results:\n")
-
-for data1, data2, label1, label2, description in comparisons:
-    print(f"--- {description} ---")
-
-    # Normality checks
-    stat1, p1 = kstest(data1, "norm", args=(data1.mean(), data1.std()))
-    stat2, p2 = kstest(data2, "norm", args=(data2.mean(), data2.std()))
-    normal1 = p1 >= 0.05
-    normal2 = p2 >= 0.05
-    print(
-        f"  {label1}: K-S p-value={p1:.4f} {'(Normal)' if normal1 else '(Non-normal)'}"
+def load_data(
+    path="resources/thingspeak_data_april_to_june_cleaned_outVSin.csv",
+    rename=True,
+):
+    try:
+        df = pd.read_csv(path)
+    except FileNotFoundError:
+        print("Error: CSV file not found. Please check the file path.")
+        exit()
+
+    # Check if required columns exist
+    required_columns = ["n1-pm10", "n1-pm25", "n2-pm10", "n2-pm25"]
+    if not all(col in df.columns for col in required_columns):
+        missing_cols = [col for col in required_columns if col not in df.columns]
+        print(
+            f"Error: CSV must contain columns: {required_columns}. Missing: {missing_cols}"
+        )
+        exit()
+
+    # Check if DataFrame is empty
+    if df.empty:
+        print("Error: CSV file is empty.")
+        exit()
+
+    # Remove rows where any of n1-pm10, n1-pm25, n2-pm10, or n2-pm25 exceed 20 µg/m³
+    outlier_condition = (
+        (df["n1-pm10"] > 20)
+        | (df["n1-pm25"] > 20)
+        | (df["n2-pm10"] > 20)
+        | (df["n2-pm25"] > 20)
     )
+    outlier_count = len(df[outlier_condition])
+    df = df[~outlier_condition]
     print(
-        f"  {label2}: K-S p-value={p2:.4f} {'(Normal)' if normal2 else '(Non-normal)'}"
+        f"Removed {outlier_count} row(s) where n1-pm10, n1-pm25, n2-pm10, or n2-pm25 > 20 µg/m³"
     )
 
-    # Variance check
-    stat_var, p_var = stats.levene(data1, data2)
-    equal_var = p_var >= 0.05
-    print(
-        f"  Levene's p-value={p_var:.4f} {'(Equal variances)' if equal_var else '(Unequal variances)'}"
+    # Check if data remains after outlier removal
+    if df.empty:
+        print("Error: No data remains after removing outliers.")
+        exit()
+
+    # Raw sensor columns are kept for pm_analysis.infiltration
+    if not rename:
+        return df
+
+    # Rename columns
+    df = df.rename(
+        columns={
+            "n1-pm10": "Внатрешен сензор (PM10)",
+            "n2-pm10": "Надворешен сензор (PM10)",
+            "n1-pm25": "Внатрешен сензор (PM2.5)",
+            "n2-pm25": "Надворешен сензор (PM2.5)",
+        }
     )
 
-    # Select and perform appropriate test
-    if normal1 and normal2 and equal_var:
-        t_stat, p_val = stats.ttest_ind(data1, data2, equal_var=True)
-        test_name = "Student's t-test"
-    elif not (normal1 and normal2):
-        t_stat, p_val = stats.mannwhitneyu(
-            data1, data2, alternative="two-sided"
+    return df
+
+
+def run_comparisons(df):
+    import scipy.stats as stats
+    from pm_analysis.normality import screen_series
+
+    # Statistical comparisons
+    comparisons = [
+        (
+            df["Надворешен сензор (PM10)"].dropna(),
+            df["Внатрешен сензор (PM10)"].dropna(),
+            "Надворешен сензор (PM10)",
+            "Внатрешен сензор (PM10)",
+            "pm10: Outside vs Inside",
+        ),
+        (
+            df["Надворешен сензор (PM2.5)"].dropna(),
+            df["Внатрешен сензор (PM2.5)"].dropna(),
+            "Надворешен сензор (PM2.5)",
+            "Внатрешен сензор (PM2.5)",
+            "pm25: Outside vs Inside",
+        ),
+    ]
+
+    print("Normality and Variance Checks, Statistical Test Results:\n")
+
+    for data1, data2, label1, label2, description in comparisons:
+        print(f"--- {description} ---")
+
+        # Normality checks
+        # K-S results are cached by data hash, see pm_analysis/normality.py
+        p1 = screen_series(data1)["ks_p"]
+        p2 = screen_series(data2)["ks_p"]
+        normal1 = p1 >= 0.05
+        normal2 = p2 >= 0.05
+        print(
+            f"  {label1}: K-S p-value={p1:.4f} {'(Normal)' if normal1 else '(Non-normal)'}"
+        )
+        print(
+            f"  {label2}: K-S p-value={p2:.4f} {'(Normal)' if normal2 else '(Non-normal)'}"
         )
-        test_name = "Mann-Whitney U test"
-    else:
-        t_stat, p_val = stats.ttest_ind(data1, data2, equal_var=False)
-        test_name = "Welch's t-test"
 
-    print(
-        f"  {test_name}: Statistic={t_stat:.2f}, p-value={p_val:.4f} {'(Significant)' if p_val < 0.05 else '(Not significant)'}"
-    )
-    print(
-        f"    {label1}: Mean={data1.mean():.2f}, Std={data1.std():.2f}, N={len(data1)}"
-    )
-    print(
-        f"    {label2}: Mean={data2.mean():.2f}, Std={data2.std():.2f}, N={len(data2)}\n"
-    )
+        # Variance check
+        stat_var, p_var = stats.levene(data1, data2)
+        equal_var = p_var >= 0.05
+        print(
+            f"  Levene's p-value={p_var:.4f} {'(Equal variances)' if equal_var else '(Unequal variances)'}"
+        )
+
+        # Select and perform appropriate test
+        if normal1 and normal2 and equal_var:
+            t_stat, p_val = stats.ttest_ind(data1, data2, equal_var=True)
+            test_name = "Student's t-test"
+        elif not (normal1 and normal2):
+            t_stat, p_val = stats.mannwhitneyu(
+                data1, data2, alternative="two-sided"
+            )
+            test_name = "Mann-Whitney U test"
+        else:
+            t_stat, p_val = stats.ttest_ind(data1, data2, equal_var=False)
+            test_name = "Welch's t-test"
+
+        print(
+            f"  {test_name}: Statistic={t_stat:.2f}, p-value={p_val:.4f} {'(Significant)' if p_val < 0.05 else '(Not significant)'}"
+        )
+        print(
+            f"    {label1}: Mean={data1.mean():.2f}, Std={data1.std():.2f}, N={len(data1)}"
+        )
+        print(
+            f"    {label2}: Mean={data2.mean():.2f}, Std={data2.std():.2f}, N={len(data2)}\n"
+        )
+
+
+def plot(df):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # Font settings
+    csfont = {"fontname": "Times New Roman"}
+
+    # Visualization
+    plt.figure(figsize=(12, 6))
+    plt.subplot(2, 1, 1)
+    sns.boxplot(data=df[["Надворешен сензор (PM10)", "Внатрешен сензор (PM10)"]])
+    plt.title("Споредба на PM10 (Надвор / Внатре)", **csfont)
+    plt.ylabel("Концентрација (µg/m³)", **csfont)
+    plt.xlabel("Сензор", **csfont)
+
+    plt.subplot(2, 1, 2)
+    sns.boxplot(data=df[["Надворешен сензор (PM2.5)", "Внатрешен сензор (PM2.5)"]])
+    plt.title("Споредба на PM25 (Надвор / Внатре)", **csfont)
+    plt.ylabel("Концентрација (µg/m³)", **csfont)
+    plt.xlabel("Сензор", **csfont)
+
+    plt.tight_layout()
+    plt.savefig("inside_vs_outside_pm10_pm25.png")
+    plt.show()
+
 
-# Visualization
-plt.figure(figsize=(12, 6))
-plt.subplot(2, 1, 1)
-sns.boxplot(data=df[["Надворешен сензор (PM10)", "Внатрешен сензор (PM10)"]])
-plt.title("Споредба на PM10 (Надвор / Внатре)", **csfont)
-plt.ylabel("Концентрација (µg/m³)", **csfont)
-plt.xlabel("Сензор", **csfont)
-
-plt.subplot(2, 1, 2)
-sns.boxplot(data=df[["Надворешен сензор (PM2.5)", "Внатрешен сензор (PM2.5)"]])
-plt.title("Споредба на PM25 (Надвор / Внатре)", **csfont)
-plt.ylabel("Концентрација (µg/m³)", **csfont)
-plt.xlabel("Сензор", **csfont)
-
-plt.tight_layout()
-plt.savefig("inside_vs_outside_pm10_pm25.png")
-plt.show()
+if __name__ == "__main__":
+    df = load_data()
+    run_comparisons(df)
+    plot(df)
@@ -1,10 +1,34 @@
+import os
+import sys
 import pandas as pd
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pm_analysis.calibration import (
+    apply_corrections,
+    load_corrections,
+    mask_sentinels,
+)
+
+# Per-sensor corrections fitted by `pm-analysis calibrate`
+calibration_path = 'calibration.csv'
+
 # Read the CSV file
 df = pd.read_csv('../data_acquisition/thingspeak_data_april_to_june.csv')
 
-# Drop rows with any missing values
-df_cleaned = df.dropna()
+# Blank out sentinel readings (e.g. CO = 1500000, NO2 = 20000)
+df_cleaned = mask_sentinels(df)
+
+# Drop metrics that never report a real value (NO2 is always 20000)
+df_cleaned = df_cleaned.dropna(axis=1, how='all')
+
+# Drop rows missing any particulate reading. CO is kept where valid and
+# left empty where the sensor reported a sentinel.
+required = [col for col in df_cleaned.columns if col.endswith(('-pm25', '-pm10'))]
+df_cleaned = df_cleaned.dropna(subset=required)
+
+# Correct each sensor against its co-located reference sensor
+if os.path.exists(calibration_path):
+    df_cleaned = apply_corrections(df_cleaned, load_corrections(calibration_path))
 
 # Save the cleaned data to a new CSV file
-df_cleaned.to_csv('thingspeak_data_april_to_june_cleaned.csv', index=False)
\ No newline at end of file
+df_cleaned.to_csv('thingspeak_data_april_to_june_cleaned.csv', index=False)
@@ -0,0 +1 @@
+"""Helpers and command line entry point for the PM2.5/PM10 analysis."""
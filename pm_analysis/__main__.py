@@ -0,0 +1,3 @@
+from pm_analysis.cli import main
+
+main()
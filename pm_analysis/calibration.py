@@ -0,0 +1,328 @@
+"""Sentinel removal and co-located sensor calibration.
+
+Each sensor listed in ``COLOCATED`` is calibrated against the reference
+sensor it shares a location with by fitting
+``reference = intercept + slope * sensor`` over sliding time windows
+(``window`` wide, one every ``step``). Only the listed pairs are fitted,
+and only with readings from the period the two sensors were together.
+Window starts are multiples of ``step`` since the epoch, so the same windows
+come out of every run and a refit only has to redo the windows that new data
+falls into.
+
+The ordinary least-squares fit is closed form: prefix sums of ``x``, ``y``,
+``x*x`` and ``x*y`` are computed once for all sensors, and every window's
+sums are a difference of two prefix rows. This fits all sensors and all
+windows in a few array operations. ``method="robust"`` refines each window
+with Huber-weighted iteratively reweighted least squares, still batched
+across sensors.
+
+Corrections are stored as CSV and applied in ``data_cleaning/clean_data.py``.
+Each hour uses the window whose midpoint is nearest to it, if that midpoint
+is at most one window width away; other hours are left as they are.
+"""
+
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Values the sensors report when a reading is out of range or missing.
+# NO2 sits at 20000 for every sensor and every hour in the data collected
+# so far, and CO saturates at 1500000.
+SENTINELS = {
+    "CO": [1500000.0, 429994.1],
+    "NO2": [20000.0],
+}
+
+# (sensor, reference, start, end): ``sensor`` was placed next to
+# ``reference`` from ``start`` to ``end`` (``None`` for an open end). In
+# data_acquisition/thingspeak_data_april_to_june.csv, n2 is channel 481429,
+# the second sensor in the same room as n1 (``same_room_two_sensors`` in
+# data_analysis_inside.py). The outdoor n2 of ``infiltration.PAIRS`` is a
+# different channel and is not calibrated here.
+COLOCATED = [
+    ("n2", "n1", "2025-04-01", None),
+]
+
+POLLUTANTS = ["pm25", "pm10"]
+
+CORRECTION_COLUMNS = [
+    "sensor",
+    "pollutant",
+    "reference",
+    "window_start",
+    "window_end",
+    "hours",
+    "slope",
+    "intercept",
+    "method",
+    "data_end",
+]
+
+_SORT_KEYS = ["sensor", "reference", "pollutant", "window_start"]
+
+# Huber tuning constant (95% efficiency for normal errors).
+_HUBER_C = 1.345
+
+
+def mask_sentinels(df, sentinels=SENTINELS):
+    """Return a copy of ``df`` with sentinel readings replaced by NaN."""
+    df = df.copy()
+    for col in df.columns:
+        metric = col.rsplit("-", 1)[-1]
+        if metric in sentinels:
+            df[col] = df[col].mask(df[col].isin(sentinels[metric]))
+    return df
+
+
+def _window_starts(first, last, window, step):
+    # Every epoch-aligned window start whose window overlaps [first, last].
+    step_ns = step.value
+    first_start = (first - window).value // step_ns * step_ns + step_ns
+    last_start = last.value // step_ns * step_ns
+    return pd.to_datetime(np.arange(first_start, last_start + 1, step_ns))
+
+
+def _ols(n, sx, sy, sxx, sxy):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denominator = n * sxx - sx**2
+        slope = (n * sxy - sx * sy) / denominator
+        slope = np.where(denominator > 0, slope, np.nan)
+        intercept = (sy - slope * sx) / n
+    return slope, intercept
+
+
+def _robust(x, y, valid, slope, intercept, iterations):
+    # Huber IRLS for one window, vectorised across sensors (columns).
+    x = np.where(valid, x, 0.0)
+    y = np.where(valid, y, 0.0)
+    for _ in range(iterations):
+        residual = np.where(valid, y - (intercept + slope * x), np.nan)
+        with warnings.catch_warnings():
+            # Sensors with no readings in this window give all-NaN columns.
+            warnings.simplefilter("ignore", RuntimeWarning)
+            scale = 1.4826 * np.nanmedian(
+                np.abs(residual - np.nanmedian(residual, axis=0)), axis=0
+            )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weight = np.minimum(1.0, _HUBER_C * scale / np.abs(residual))
+        weight = np.where(valid, np.nan_to_num(weight, nan=1.0), 0.0)
+        slope, intercept = _ols(
+            weight.sum(axis=0),
+            (weight * x).sum(axis=0),
+            (weight * y).sum(axis=0),
+            (weight * x * x).sum(axis=0),
+            (weight * x * y).sum(axis=0),
+        )
+    return slope, intercept
+
+
+def fit_corrections(
+    df,
+    pairs=COLOCATED,
+    pollutants=POLLUTANTS,
+    window="7D",
+    step="1D",
+    method="linear",
+    min_hours=24,
+    since=None,
+    time_col="UTC",
+    iterations=5,
+):
+    """Fit per-sensor corrections for the co-located ``pairs``.
+
+    ``df`` is a wide hourly frame with ``<sensor>-<pollutant>`` columns.
+    ``pairs`` lists ``(sensor, reference, start, end)`` as in ``COLOCATED``;
+    readings outside ``[start, end)`` are not used. With ``since``, only
+    windows ending after ``since`` are fitted, and only the data they cover
+    is read. Windows with fewer than ``min_hours`` paired readings are left
+    out.
+
+    Returns one row per (sensor, pollutant, window) with ``slope`` and
+    ``intercept``; empty if no pair has data.
+    """
+    if method not in ("linear", "robust"):
+        raise ValueError(f"Unknown calibration method: {method!r}")
+    window = pd.Timedelta(window)
+    step = pd.Timedelta(step)
+
+    times = pd.to_datetime(df[time_col])
+    order = np.argsort(times.to_numpy(), kind="stable")
+    df = df.iloc[order]
+    times = pd.DatetimeIndex(times.iloc[order])
+
+    starts = _window_starts(times[0], times[-1], window, step)
+    if since is not None:
+        starts = starts[starts + window > pd.Timestamp(since)]
+    if len(starts) == 0:
+        return pd.DataFrame(columns=CORRECTION_COLUMNS)
+    keep = times >= starts[0]
+    df = df[keep]
+    times = times[keep]
+
+    columns = []
+    for sensor, reference, start, end in pairs:
+        if sensor == reference:
+            continue
+        for pollutant in pollutants:
+            col = f"{sensor}-{pollutant}"
+            ref_col = f"{reference}-{pollutant}"
+            if col in df.columns and ref_col in df.columns:
+                columns.append(
+                    (sensor, reference, pollutant, col, ref_col, start, end)
+                )
+    if not columns:
+        return pd.DataFrame(columns=CORRECTION_COLUMNS)
+
+    # (hours, sensors) matrices of raw readings and the matching reference.
+    x = df[[c[3] for c in columns]].to_numpy(dtype=float)
+    y = df[[c[4] for c in columns]].to_numpy(dtype=float)
+    valid = ~np.isnan(x) & ~np.isnan(y)
+    for i, (*_, start, end) in enumerate(columns):
+        if start is not None:
+            valid[:, i] &= times >= pd.Timestamp(start)
+        if end is not None:
+            valid[:, i] &= times < pd.Timestamp(end)
+    xv = np.where(valid, x, 0.0)
+    yv = np.where(valid, y, 0.0)
+
+    def prefix(values):
+        return np.vstack(
+            [np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)]
+        )
+
+    sums = [
+        prefix(valid.astype(float)),
+        prefix(xv),
+        prefix(yv),
+        prefix(xv * xv),
+        prefix(xv * yv),
+    ]
+
+    lo = times.searchsorted(starts, side="left")
+    hi = times.searchsorted(starts + window, side="left")
+    n, sx, sy, sxx, sxy = (s[hi] - s[lo] for s in sums)
+    slope, intercept = _ols(n, sx, sy, sxx, sxy)
+
+    if method == "robust":
+        for w in range(len(starts)):
+            if hi[w] > lo[w]:
+                slope[w], intercept[w] = _robust(
+                    x[lo[w]:hi[w]],
+                    y[lo[w]:hi[w]],
+                    valid[lo[w]:hi[w]],
+                    slope[w],
+                    intercept[w],
+                    iterations,
+                )
+
+    corrections = pd.DataFrame(
+        {
+            "sensor": np.tile([c[0] for c in columns], len(starts)),
+            "pollutant": np.tile([c[2] for c in columns], len(starts)),
+            "reference": np.tile([c[1] for c in columns], len(starts)),
+            "window_start": np.repeat(starts, len(columns)),
+            "window_end": np.repeat(starts + window, len(columns)),
+            "hours": n.ravel().astype(int),
+            "slope": slope.ravel(),
+            "intercept": intercept.ravel(),
+            "method": method,
+            "data_end": times[-1],
+        }
+    )
+    corrections = corrections[
+        (corrections["hours"] >= min_hours) & corrections["slope"].notna()
+    ]
+    return corrections.sort_values(_SORT_KEYS).reset_index(drop=True)
+
+
+def update_corrections(corrections, df, **kwargs):
+    """Refit only the windows that data newer than the last fit falls into.
+
+    Windows that ended before the previous fit's last reading are kept
+    as they are; the rest are refitted from ``df``.
+    """
+    if corrections.empty:
+        return fit_corrections(df, **kwargs)
+    since = pd.Timestamp(corrections["data_end"].max())
+    kept = corrections[corrections["window_end"] <= since]
+    refit = fit_corrections(df, since=since, **kwargs)
+    if refit.empty:
+        return corrections
+    return (
+        pd.concat([kept, refit], ignore_index=True)
+        .sort_values(_SORT_KEYS)
+        .reset_index(drop=True)
+    )
+
+
+def load_corrections(path):
+    """Read stored corrections; an empty file gives an empty frame."""
+    try:
+        return pd.read_csv(
+            path, parse_dates=["window_start", "window_end", "data_end"]
+        )
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame(columns=CORRECTION_COLUMNS)
+
+
+def save_corrections(corrections, path):
+    tmp_path = path + ".tmp"
+    corrections.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def apply_corrections(df, corrections, pairs=COLOCATED, time_col="UTC"):
+    """Return a copy of ``df`` with the stored corrections applied.
+
+    Only corrections of a (sensor, reference) pair listed in ``pairs`` are
+    used. Each reading is corrected with the window of its sensor and
+    pollutant whose midpoint is nearest in time and at most one window width
+    away; readings with no such window and reference sensors are unchanged.
+    """
+    df = df.copy()
+    if corrections.empty:
+        return df
+    listed = {(sensor, reference) for sensor, reference, *_ in pairs}
+    corrections = corrections[
+        [
+            (sensor, reference) in listed
+            for sensor, reference in zip(
+                corrections["sensor"], corrections["reference"]
+            )
+        ]
+    ]
+    times = pd.DataFrame(
+        {
+            "timestamp": pd.to_datetime(df[time_col]).astype("datetime64[ns]"),
+            "row": np.arange(len(df)),
+        }
+    ).sort_values("timestamp")
+
+    for (sensor, pollutant), fits in corrections.groupby(
+        ["sensor", "pollutant"]
+    ):
+        col = f"{sensor}-{pollutant}"
+        if col not in df.columns:
+            continue
+        width = fits["window_end"] - fits["window_start"]
+        fits = fits.assign(
+            midpoint=(fits["window_start"] + width / 2).astype(
+                "datetime64[ns]"
+            )
+        ).sort_values("midpoint")
+        matched = pd.merge_asof(
+            times,
+            fits[["midpoint", "slope", "intercept"]],
+            left_on="timestamp",
+            right_on="midpoint",
+            direction="nearest",
+            tolerance=width.max(),
+        ).sort_values("row")
+        raw = pd.to_numeric(df[col], errors="coerce").to_numpy()
+        corrected = (
+            matched["intercept"].to_numpy() + matched["slope"].to_numpy() * raw
+        ).round(3)
+        df[col] = np.where(matched["slope"].notna(), corrected, raw)
+    return df
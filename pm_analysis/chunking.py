@@ -0,0 +1,75 @@
+"""Adaptive request windows for ThingSpeak's per-response result cap.
+
+ThingSpeak returns at most 8000 entries per request and silently drops the
+rest. ``adaptive_chunks`` walks a time range with windows sized from the
+number of entries each response returned:
+
+* a response that reaches the cap may be truncated, so the window is split
+  in half and fetched again;
+* otherwise the next window is sized so it is expected to return about
+  ``fill`` of the cap, which grows windows quickly on sparse channels.
+
+A window of ``min_size`` that still reaches the cap cannot be split further
+and raises ``TruncatedWindowError`` instead of returning partial data.
+"""
+
+from datetime import timedelta
+
+THINGSPEAK_RESULT_CAP = 8000
+
+
+class TruncatedWindowError(RuntimeError):
+    """A ``min_size`` window returned the full cap, so entries are missing."""
+
+
+def adaptive_chunks(
+    fetch,
+    start,
+    end,
+    initial=timedelta(days=3),
+    cap=THINGSPEAK_RESULT_CAP,
+    min_size=timedelta(hours=1),
+    max_size=timedelta(days=90),
+    fill=0.5,
+):
+    """Fetch ``[start, end)`` and yield ``(window_start, window_end, df)``.
+
+    ``fetch(window_start, window_end)`` must return a DataFrame with one row
+    per returned entry. Every yielded window returned fewer than ``cap``
+    entries, so its data is complete. Exceptions from ``fetch``, and
+    ``TruncatedWindowError`` for a ``min_size`` window that reached the cap,
+    are raised with the failing window attached as
+    ``error.window = (window_start, window_end)``; windows yielded before
+    the exception are complete.
+    """
+    size = initial
+    current = start
+    while current < end:
+        window_end = min(current + size, end)
+        width = window_end - current
+        try:
+            df = fetch(current, window_end)
+        except Exception as error:
+            error.window = (current, window_end)
+            raise
+        count = len(df)
+
+        if count >= cap:
+            if width <= min_size:
+                error = TruncatedWindowError(
+                    f"{count} entries in {width}, the smallest window"
+                )
+                error.window = (current, window_end)
+                raise error
+            # Possibly truncated: fetch the first half again.
+            size = max(width / 2, min_size)
+            continue
+
+        yield current, window_end, df
+        current = window_end
+
+        if count == 0:
+            size = width * 2
+        else:
+            size = width * (fill * cap / count)
+        size = min(max(size, min_size), max_size)
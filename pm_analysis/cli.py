@@ -0,0 +1,243 @@
+"""``pm-analysis`` command line entry point.
+
+Each subcommand runs one stage of the pipeline. Only ``argparse`` and the
+standard library are imported up front; pandas, scipy, matplotlib and seaborn
+are imported by the stage itself, so text-only runs such as ``validate`` or
+``compare`` never load the plotting stack.
+"""
+
+import argparse
+import importlib.util
+import os
+import runpy
+import sys
+from contextlib import contextmanager
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Subcommand -> (script, default working directory), both relative to the
+# repository root. The scripts read and write paths relative to the working
+# directory, so each one is run from the folder its inputs live in.
+SCRIPTS = {
+    "fetch": ("data_acquisition/data_fetch.py", "data_acquisition"),
+    "clean": ("data_cleaning/clean_data.py", "data_cleaning"),
+    "label": ("data_labeling/labeled_data.py", "data_labeling"),
+    "split": ("data-sort/data-sorting-by-sensor.py", "data-sort"),
+    "categorize": ("data-sort/categories-by-frequency.py", "data-sort/sensors"),
+    "validate": ("data-sort/valid-data.py", "data-sort/sensors"),
+}
+
+ANALYSES = {
+    "inside": "data_analysis/data_analysis_inside.py",
+    "outside": "data_analysis/data_analysis_inside_vs_outside.py",
+}
+
+# Plot-only scripts with no separate statistics step.
+PLOTS = {
+    "occupancy": "data_analysis/people_effect_visualization.py",
+    "temporal": "data_analysis/people_effect_temporal_interaction.py",
+}
+
+
+@contextmanager
+def _working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def _resolve(path):
+    return os.path.join(REPO_ROOT, path)
+
+
+def _run_script(script, workdir):
+    # Mirror ``python script.py``: the script's folder goes first on sys.path.
+    script = _resolve(script)
+    sys.path.insert(0, os.path.dirname(script))
+    try:
+        with _working_directory(workdir):
+            runpy.run_path(script, run_name="__main__")
+    finally:
+        sys.path.remove(os.path.dirname(script))
+
+
+def _load_script(script):
+    # The analysis scripts live in plain folders, so load them by path.
+    script = _resolve(script)
+    name = os.path.splitext(os.path.basename(script))[0]
+    spec = importlib.util.spec_from_file_location(name, script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _stage(args):
+    script, workdir = SCRIPTS[args.command]
+    _run_script(script, args.workdir or _resolve(workdir))
+
+
+def _compare(args):
+    workdir = args.workdir or _resolve("data_analysis")
+    for name in args.analyses or sorted(ANALYSES):
+        module = _load_script(ANALYSES[name])
+        with _working_directory(workdir):
+            df = module.load_data()
+            module.run_comparisons(df)
+
+
+def _plot(args):
+    workdir = args.workdir or _resolve("data_analysis")
+    for name in args.figures or sorted(ANALYSES) + sorted(PLOTS):
+        if name in PLOTS:
+            _run_script(PLOTS[name], workdir)
+            continue
+        module = _load_script(ANALYSES[name])
+        with _working_directory(workdir):
+            module.plot(module.load_data())
+
+
+def _ratios(args):
+    from pm_analysis.infiltration import daily_ratios
+
+    module = _load_script(ANALYSES["outside"])
+    with _working_directory(args.workdir or _resolve("data_analysis")):
+        df = module.load_data(rename=False)
+    print(daily_ratios(df).to_string(index=False))
+
+
+def _calibrate(args):
+    import pandas as pd
+    from pm_analysis import calibration
+
+    with _working_directory(args.workdir or _resolve("data_cleaning")):
+        df = calibration.mask_sentinels(
+            pd.read_csv("../data_acquisition/thingspeak_data_april_to_june.csv")
+        )
+        pairs = calibration.COLOCATED
+        if args.sensors:
+            pairs = [pair for pair in pairs if pair[0] in args.sensors]
+        options = dict(
+            pairs=pairs,
+            window=args.window,
+            step=args.step,
+            method=args.method,
+        )
+        if args.update and os.path.exists("calibration.csv"):
+            corrections = calibration.update_corrections(
+                calibration.load_corrections("calibration.csv"), df, **options
+            )
+        else:
+            corrections = calibration.fit_corrections(df, **options)
+        if corrections.empty:
+            sys.exit(
+                "No corrections fitted: no pair in "
+                "pm_analysis.calibration.COLOCATED has enough co-located "
+                "readings. calibration.csv was not changed."
+            )
+        calibration.save_corrections(corrections, "calibration.csv")
+    print(f"Saved {len(corrections)} window corrections to calibration.csv")
+
+
+def _one_of(names):
+    # Used instead of ``choices``, which rejects an empty ``nargs="*"`` list.
+    def check(value):
+        if value not in names:
+            raise argparse.ArgumentTypeError(
+                f"invalid choice: {value!r} (choose from {', '.join(names)})"
+            )
+        return value
+
+    return check
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="pm-analysis",
+        description="PM2.5/PM10 data pipeline and statistical analysis.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    helps = {
+        "fetch": "download hourly ThingSpeak data",
+        "clean": "drop incomplete rows from the fetched data",
+        "label": "merge occupancy labels into the cleaned data",
+        "split": "split the combined dataset into one file per sensor",
+        "categorize": "add frequency categories to the per-sensor files",
+        "validate": "report time range and gaps for each sensor",
+    }
+    for command, help_text in helps.items():
+        sub = subparsers.add_parser(command, help=help_text)
+        sub.add_argument(
+            "--workdir",
+            help=f"run from this directory (default: {SCRIPTS[command][1]})",
+        )
+        sub.set_defaults(func=_stage)
+
+    compare = subparsers.add_parser(
+        "compare", help="run the statistical comparisons without plotting"
+    )
+    compare.add_argument(
+        "analyses",
+        nargs="*",
+        type=_one_of(sorted(ANALYSES)),
+        metavar="ANALYSIS",
+        help=f"one or more of {', '.join(sorted(ANALYSES))} (default: all)",
+    )
+    compare.add_argument("--workdir", help="default: data_analysis")
+    compare.set_defaults(func=_compare)
+
+    figures = sorted(ANALYSES) + sorted(PLOTS)
+    plot = subparsers.add_parser("plot", help="draw and save the figures")
+    plot.add_argument(
+        "figures",
+        nargs="*",
+        type=_one_of(figures),
+        metavar="FIGURE",
+        help=f"one or more of {', '.join(figures)} (default: all)",
+    )
+    plot.add_argument("--workdir", help="default: data_analysis")
+    plot.set_defaults(func=_plot)
+
+    calibrate = subparsers.add_parser(
+        "calibrate",
+        help="fit corrections for the co-located sensors in "
+        "pm_analysis.calibration.COLOCATED",
+    )
+    calibrate.add_argument(
+        "--sensors", nargs="+", help="sensors to calibrate (default: all)"
+    )
+    calibrate.add_argument("--window", default="7D")
+    calibrate.add_argument("--step", default="1D")
+    calibrate.add_argument(
+        "--method", choices=["linear", "robust"], default="linear"
+    )
+    calibrate.add_argument(
+        "--update",
+        action="store_true",
+        help="only refit windows touched by data newer than the last fit",
+    )
+    calibrate.add_argument("--workdir", help="default: data_cleaning")
+    calibrate.set_defaults(func=_calibrate)
+
+    ratios = subparsers.add_parser(
+        "ratios",
+        help="daily indoor/outdoor ratios and infiltration factors",
+    )
+    ratios.add_argument("--workdir", help="default: data_analysis")
+    ratios.set_defaults(func=_ratios)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.workdir:
+        args.workdir = os.path.abspath(args.workdir)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Hive-style dataset partitioned by channel and month.
+
+Hourly readings are stored one CSV per (channel, month)::
+
+    <root>/channel=n1/month=2025-04/data.csv
+
+so a reader asking for one sensor over one week only opens the partition
+that covers that week. Each file holds ``timestamp`` plus one column per
+metric (``pm25``, ``pm10``, ``CO``, ``NO2``).
+"""
+
+import os
+
+import pandas as pd
+
+DATA_FILE = "data.csv"
+
+
+def _partition_dir(root, channel, month):
+    return os.path.join(root, f"channel={channel}", f"month={month}")
+
+
+def _partition_values(root, key):
+    # Values of the ``key=value`` directories directly under ``root``.
+    if not os.path.isdir(root):
+        return []
+    prefix = f"{key}="
+    return sorted(
+        name[len(prefix):]
+        for name in os.listdir(root)
+        if name.startswith(prefix)
+        and os.path.isdir(os.path.join(root, name))
+    )
+
+
+def write_partitions(df, root, time_col="timestamp", channel_col="channel"):
+    """Write ``df`` into channel/month partitions under ``root``.
+
+    Rows are merged into any existing partition; for repeated timestamps
+    the newly written row wins. Returns the list of files written.
+    """
+    if df.empty:
+        return []
+
+    df = df.copy()
+    df[time_col] = pd.to_datetime(df[time_col])
+    months = df[time_col].dt.strftime("%Y-%m")
+
+    written = []
+    for (channel, month), part in df.groupby([df[channel_col], months]):
+        part = part.drop(columns=[channel_col]).rename(
+            columns={time_col: "timestamp"}
+        )
+        path = os.path.join(_partition_dir(root, channel, month), DATA_FILE)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        if os.path.exists(path):
+            existing = pd.read_csv(path, parse_dates=["timestamp"])
+            part = pd.concat([existing, part], ignore_index=True)
+        part = (
+            part.drop_duplicates(subset="timestamp", keep="last")
+            .sort_values("timestamp")
+            .reset_index(drop=True)
+        )
+
+        # Write to a temporary file first so a crash never leaves a
+        # half-written partition behind.
+        tmp_path = path + ".tmp"
+        part.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        written.append(path)
+
+    return written
+
+
+def list_partitions(root, start=None, end=None, sensors=None):
+    """Return the partition files that may hold rows in ``[start, end)``.
+
+    Only directory names are inspected; no data file is opened.
+    """
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+
+    paths = []
+    for channel in _partition_values(root, "channel"):
+        if sensors is not None and channel not in sensors:
+            continue
+        channel_root = os.path.join(root, f"channel={channel}")
+        for month in _partition_values(channel_root, "month"):
+            month_start = pd.Timestamp(f"{month}-01")
+            month_end = month_start + pd.offsets.MonthBegin(1)
+            if start is not None and month_end <= start:
+                continue
+            if end is not None and month_start >= end:
+                continue
+            path = os.path.join(
+                _partition_dir(root, channel, month), DATA_FILE
+            )
+            if os.path.exists(path):
+                paths.append((channel, path))
+    return paths
+
+
+def read_partitions(root, start=None, end=None, sensors=None, columns=None):
+    """Read hourly readings for ``sensors`` between ``start`` and ``end``.
+
+    ``start`` is inclusive and ``end`` exclusive; either may be None for an
+    open range, and ``sensors=None`` reads every channel. ``columns``
+    restricts the metric columns loaded from each file. Returns a long
+    DataFrame with ``timestamp``, ``channel`` and the metric columns.
+    """
+    usecols = None
+    if columns is not None:
+        usecols = lambda col: col == "timestamp" or col in columns
+
+    frames = []
+    for channel, path in list_partitions(root, start, end, sensors):
+        part = pd.read_csv(path, usecols=usecols, parse_dates=["timestamp"])
+        if start is not None:
+            part = part[part["timestamp"] >= pd.Timestamp(start)]
+        if end is not None:
+            part = part[part["timestamp"] < pd.Timestamp(end)]
+        part.insert(1, "channel", channel)
+        frames.append(part)
+
+    if not frames:
+        return pd.DataFrame(
+            columns=["timestamp", "channel"] + list(columns or [])
+        )
+    return pd.concat(frames, ignore_index=True)
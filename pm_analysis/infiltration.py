@@ -0,0 +1,317 @@
+"""Indoor/outdoor (I/O) ratios and infiltration factors per sensor pair.
+
+For every (indoor, outdoor) sensor pair and pollutant this computes
+
+* the hourly I/O ratio ``C_in / C_out``,
+* daily and rolling I/O ratios as the ratio of mean concentrations, and
+* the infiltration factor ``F_inf``: the slope of the least-squares fit
+  ``C_in = F_inf * C_out + C_ig``, where ``C_ig`` is the part of the indoor
+  concentration generated indoors.
+
+All of these depend on the data only through the count, the means of
+both series, the outdoor sum of squared deviations and the co-moment of
+outdoor and indoor. They are kept as centred (Welford-style) moments rather
+than raw sums, so adding and removing hours leaves no floating-point residue
+that could pass for variance. Windows where outdoor is effectively constant
+give no infiltration factor. The batch functions get the same moments from
+pandas rolling/groupby operations over the full history.
+``InfiltrationEngine`` updates them per pair as each hour arrives and as
+old hours leave the window, so each new hour is an O(1) update.
+
+Input frames are in the wide layout used by the analysis scripts: one row
+per hour with a ``UTC`` column and ``<sensor>-<pollutant>`` columns, e.g.
+the output of ``load_data(rename=False)`` in
+``data_analysis/data_analysis_inside_vs_outside.py``.
+"""
+
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+# (indoor, outdoor) sensor pairs. n1 is inside the room and n2 outside the
+# window, as in data_analysis_inside_vs_outside.py.
+PAIRS = [("n1", "n2")]
+
+POLLUTANTS = ["pm25", "pm10"]
+
+# Relative tolerance below which the outdoor variance counts as zero.
+_VARIANCE_TOLERANCE = 1e-9
+
+
+def _from_moments(n, mean_out, mean_in, m2_out, c_out_in, min_periods=3):
+    # Ratio of means and least-squares slope/intercept from centred moments.
+    # Works on scalars and arrays alike.
+    n = np.asarray(n, dtype=float)
+    mean_out = np.asarray(mean_out, dtype=float)
+    mean_in = np.asarray(mean_in, dtype=float)
+    m2_out = np.asarray(m2_out, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        io_ratio = np.where(mean_out > 0, mean_in / mean_out, np.nan)
+        varies = m2_out > _VARIANCE_TOLERANCE * (m2_out + n * mean_out**2)
+        slope = np.where(
+            (n >= min_periods) & varies, c_out_in / m2_out, np.nan
+        )
+        intercept = mean_in - slope * mean_out
+    return io_ratio, slope, intercept
+
+
+def _pair_frame(df, indoor, outdoor, pollutant, time_col):
+    # One pair/pollutant as a time-indexed frame. Hours where either sensor
+    # is missing are NaN in both ``indoor``/``outdoor`` so they drop out of
+    # every moment.
+    c_in = pd.to_numeric(df[f"{indoor}-{pollutant}"], errors="coerce")
+    c_out = pd.to_numeric(df[f"{outdoor}-{pollutant}"], errors="coerce")
+    valid = c_in.notna() & c_out.notna()
+    terms = pd.DataFrame(
+        {
+            "indoor_value": c_in,
+            "outdoor_value": c_out,
+            "indoor": c_in.where(valid),
+            "outdoor": c_out.where(valid),
+        }
+    )
+    terms.index = pd.DatetimeIndex(
+        pd.to_datetime(df[time_col]), name="timestamp"
+    )
+    return terms.sort_index()
+
+
+def _pairs(df, pairs, pollutants):
+    for indoor, outdoor in pairs:
+        for pollutant in pollutants:
+            columns = [f"{indoor}-{pollutant}", f"{outdoor}-{pollutant}"]
+            if all(col in df.columns for col in columns):
+                yield indoor, outdoor, pollutant
+
+
+def _labelled(frame, indoor, outdoor, pollutant):
+    frame.insert(0, "pollutant", pollutant)
+    frame.insert(0, "outdoor", outdoor)
+    frame.insert(0, "indoor", indoor)
+    return frame
+
+
+def hourly_ratios(df, pairs=PAIRS, pollutants=POLLUTANTS, time_col="UTC"):
+    """Hourly I/O ratio for every pair and pollutant, as a long frame."""
+    frames = []
+    for indoor, outdoor, pollutant in _pairs(df, pairs, pollutants):
+        terms = _pair_frame(df, indoor, outdoor, pollutant, time_col)
+        out = terms[["indoor_value", "outdoor_value"]].reset_index()
+        c_out = out["outdoor_value"]
+        out["io_ratio"] = (out["indoor_value"] / c_out).where(c_out > 0)
+        frames.append(_labelled(out, indoor, outdoor, pollutant))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def _summarise(moments, min_periods):
+    io_ratio, slope, intercept = _from_moments(
+        moments["n"].to_numpy(),
+        moments["mean_out"].to_numpy(),
+        moments["mean_in"].to_numpy(),
+        moments["m2_out"].to_numpy(),
+        moments["c_out_in"].to_numpy(),
+        min_periods=min_periods,
+    )
+    return pd.DataFrame(
+        {
+            "hours": moments["n"].fillna(0).astype(int).to_numpy(),
+            "io_ratio": io_ratio,
+            "infiltration_factor": slope,
+            "indoor_generated": intercept,
+        },
+        index=moments.index,
+    )
+
+
+def daily_ratios(
+    df, pairs=PAIRS, pollutants=POLLUTANTS, time_col="UTC", min_periods=3
+):
+    """Daily I/O ratio and infiltration factor for every pair and pollutant."""
+    frames = []
+    for indoor, outdoor, pollutant in _pairs(df, pairs, pollutants):
+        terms = _pair_frame(df, indoor, outdoor, pollutant, time_col)
+        day = terms.index.floor("D")
+        days = terms.groupby(day)
+        # Deviations from each day's own means, so no sums are subtracted.
+        dev_out = terms["outdoor"] - days["outdoor"].transform("mean")
+        dev_in = terms["indoor"] - days["indoor"].transform("mean")
+        moments = pd.DataFrame(
+            {
+                "n": days["outdoor"].count(),
+                "mean_out": days["outdoor"].mean(),
+                "mean_in": days["indoor"].mean(),
+                "m2_out": (dev_out**2).groupby(day).sum(),
+                "c_out_in": (dev_out * dev_in).groupby(day).sum(),
+            }
+        )
+        moments = moments.asfreq("D", fill_value=0)
+        out = _summarise(moments, min_periods)
+        out = out.rename_axis("date").reset_index()
+        frames.append(_labelled(out, indoor, outdoor, pollutant))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def rolling_ratios(
+    df,
+    pairs=PAIRS,
+    pollutants=POLLUTANTS,
+    window="24h",
+    time_col="UTC",
+    min_periods=3,
+):
+    """Rolling I/O ratio and infiltration factor over a trailing time window.
+
+    The window at hour ``t`` covers ``(t - window, t]``, the same as
+    ``InfiltrationEngine``.
+    """
+    frames = []
+    for indoor, outdoor, pollutant in _pairs(df, pairs, pollutants):
+        terms = _pair_frame(df, indoor, outdoor, pollutant, time_col)
+        rolling_out = terms["outdoor"].rolling(window)
+        n = rolling_out.count()
+        moments = pd.DataFrame(
+            {
+                "n": n,
+                "mean_out": rolling_out.mean(),
+                "mean_in": terms["indoor"].rolling(window).mean(),
+                "m2_out": rolling_out.var(ddof=0) * n,
+                "c_out_in": rolling_out.cov(terms["indoor"], ddof=0) * n,
+            }
+        )
+        out = _summarise(moments, min_periods).reset_index()
+        frames.append(_labelled(out, indoor, outdoor, pollutant))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+class RollingInfiltration:
+    """Running I/O ratio and infiltration factor for one pair and pollutant.
+
+    Keeps the readings of the last ``window`` and their centred moments;
+    ``update`` adds the newest hour, removes the ones that fell out of the
+    window and returns the current estimates.
+    """
+
+    def __init__(self, window="24h", min_periods=3):
+        self.window = pd.Timedelta(window)
+        self.min_periods = min_periods
+        self._readings = deque()
+        self._reset()
+
+    def _reset(self):
+        self.n = 0
+        self.mean_out = 0.0
+        self.mean_in = 0.0
+        self.m2_out = 0.0
+        self.c_out_in = 0.0
+
+    def _add(self, c_out, c_in):
+        self.n += 1
+        d_out = c_out - self.mean_out
+        d_in = c_in - self.mean_in
+        self.mean_out += d_out / self.n
+        self.mean_in += d_in / self.n
+        self.m2_out += d_out * (c_out - self.mean_out)
+        self.c_out_in += d_out * (c_in - self.mean_in)
+
+    def _remove(self, c_out, c_in):
+        self.n -= 1
+        if self.n == 0:
+            # Start from exact zeros instead of carrying residue forward.
+            self._reset()
+            return
+        d_out = c_out - self.mean_out
+        d_in = c_in - self.mean_in
+        self.mean_out -= d_out / self.n
+        self.mean_in -= d_in / self.n
+        self.m2_out -= d_out * (c_out - self.mean_out)
+        self.c_out_in -= d_out * (c_in - self.mean_in)
+        self.m2_out = max(self.m2_out, 0.0)
+
+    def update(self, timestamp, indoor, outdoor):
+        timestamp = pd.Timestamp(timestamp)
+        if self._readings and timestamp < self._readings[-1][0]:
+            raise ValueError(
+                f"Readings must arrive in time order: {timestamp} is before "
+                f"{self._readings[-1][0]}"
+            )
+
+        if pd.notna(indoor) and pd.notna(outdoor):
+            self._readings.append((timestamp, float(outdoor), float(indoor)))
+            self._add(float(outdoor), float(indoor))
+
+        cutoff = timestamp - self.window
+        while self._readings and self._readings[0][0] <= cutoff:
+            _, c_out, c_in = self._readings.popleft()
+            self._remove(c_out, c_in)
+
+        io_ratio, slope, intercept = _from_moments(
+            self.n,
+            self.mean_out if self.n else np.nan,
+            self.mean_in if self.n else np.nan,
+            self.m2_out,
+            self.c_out_in,
+            min_periods=self.min_periods,
+        )
+        hourly = np.nan
+        if pd.notna(indoor) and pd.notna(outdoor) and outdoor > 0:
+            hourly = indoor / outdoor
+        return {
+            "timestamp": timestamp,
+            "indoor_value": indoor,
+            "outdoor_value": outdoor,
+            "io_ratio_hourly": hourly,
+            "hours": self.n,
+            "io_ratio": float(io_ratio),
+            "infiltration_factor": float(slope),
+            "indoor_generated": float(intercept),
+        }
+
+
+class InfiltrationEngine:
+    """Incremental I/O estimates for every sensor pair and pollutant.
+
+    Feed one wide row per hour to ``update``; each call costs O(1) per
+    pair, independent of how much history has been seen.
+    """
+
+    def __init__(
+        self, pairs=PAIRS, pollutants=POLLUTANTS, window="24h", min_periods=3
+    ):
+        self.trackers = {
+            (indoor, outdoor, pollutant): RollingInfiltration(
+                window, min_periods
+            )
+            for indoor, outdoor in pairs
+            for pollutant in pollutants
+        }
+
+    def update(self, timestamp, readings):
+        """Add one hour of readings (``{"n1-pm25": ..., ...}``).
+
+        Returns one result dict per pair and pollutant.
+        """
+        results = []
+        for (indoor, outdoor, pollutant), tracker in self.trackers.items():
+            result = tracker.update(
+                timestamp,
+                readings.get(f"{indoor}-{pollutant}", np.nan),
+                readings.get(f"{outdoor}-{pollutant}", np.nan),
+            )
+            results.append(
+                {
+                    "indoor": indoor,
+                    "outdoor": outdoor,
+                    "pollutant": pollutant,
+                    **result,
+                }
+            )
+        return results
+
+    def run(self, df, time_col="UTC"):
+        """Feed every row of ``df`` in time order and collect the results."""
+        df = df.assign(**{time_col: pd.to_datetime(df[time_col])})
+        rows = []
+        for record in df.sort_values(time_col).to_dict("records"):
+            rows.extend(self.update(record[time_col], record))
+        return pd.DataFrame(rows)
@@ -0,0 +1,288 @@
+"""On-disk ledger of fetched chunks for long, resumable backfills.
+
+Every (channel, window) request is recorded in ``<root>/ledger.csv`` as
+``pending`` when it is sent and as ``done`` or ``failed`` when it returns.
+Windows still pending after a run are the requests that were in flight when
+it stopped. A finished chunk is written to ``<root>/chunks/`` as soon as it
+arrives, so nothing is held in memory between chunks and a crash loses at
+most the chunks in flight.
+
+Windows do not have to follow a fixed grid. Whatever no ``done`` window
+covers is still to be fetched: ``missing`` returns those gaps, so the next
+run fetches exactly the failed, interrupted and never-fetched parts of the
+range, with window sizes of its own choosing. ``backfill`` runs that loop
+for one channel.
+"""
+
+import os
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from pm_analysis.chunking import adaptive_chunks
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+COLUMNS = ["channel", "start", "end", "status", "attempts", "path", "error"]
+
+_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _key(channel, start, end):
+    return (channel, start.strftime(_TIME_FORMAT), end.strftime(_TIME_FORMAT))
+
+
+class ChunkLedger:
+    """Status of every (channel, window) chunk of a backfill.
+
+    The ledger is rewritten after every status change, so it always
+    reflects what is already on disk. Safe to update from several threads.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.path = os.path.join(root, "ledger.csv")
+        self.chunk_dir = os.path.join(root, "chunks")
+        os.makedirs(self.chunk_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(self.path):
+            ledger = pd.read_csv(self.path, dtype=str, keep_default_na=False)
+            for row in ledger.to_dict("records"):
+                row["attempts"] = int(row["attempts"])
+                self.entries[(row["channel"], row["start"], row["end"])] = row
+
+    def _write(self):
+        tmp_path = self.path + ".tmp"
+        pd.DataFrame(list(self.entries.values()), columns=COLUMNS).to_csv(
+            tmp_path, index=False
+        )
+        os.replace(tmp_path, self.path)
+
+    def _entry(self, channel, start, end):
+        key = _key(channel, start, end)
+        if key not in self.entries:
+            self.entries[key] = {
+                "channel": channel,
+                "start": key[1],
+                "end": key[2],
+                "status": "",
+                "attempts": 0,
+                "path": "",
+                "error": "",
+            }
+        return self.entries[key]
+
+    def _settle(self, channel, start, end):
+        # A window that was split after hitting the result cap starts where
+        # its first half starts; once that half returns it is superseded.
+        key = _key(channel, start, end)
+        for other in list(self.entries):
+            entry = self.entries[other]
+            if (
+                other != key
+                and other[:2] == key[:2]
+                and entry["status"] == PENDING
+            ):
+                del self.entries[other]
+
+    def mark_pending(self, channel, start, end):
+        """Record that a request for the window is about to be sent."""
+        with self._lock:
+            entry = self._entry(channel, start, end)
+            entry["status"] = PENDING
+            self._write()
+
+    def mark_done(self, channel, start, end, df):
+        """Write the chunk's data to disk and mark the window done."""
+        with self._lock:
+            self._mark_done(channel, start, end, df)
+
+    def _mark_done(self, channel, start, end, df):
+        entry = self._entry(channel, start, end)
+        entry["attempts"] += 1
+        entry["path"] = ""
+        if not df.empty:
+            name = (
+                f"{channel}_{start.strftime('%Y%m%d%H%M%S')}"
+                f"_{end.strftime('%Y%m%d%H%M%S')}.csv"
+            )
+            path = os.path.join(self.chunk_dir, name)
+            tmp_path = path + ".tmp"
+            df.to_csv(tmp_path, index=False)
+            os.replace(tmp_path, path)
+            entry["path"] = name
+        entry["status"] = DONE
+        entry["error"] = ""
+        self._settle(channel, start, end)
+        self._write()
+
+    def mark_failed(self, channel, start, end, error):
+        with self._lock:
+            entry = self._entry(channel, start, end)
+            entry["attempts"] += 1
+            entry["status"] = FAILED
+            entry["error"] = str(error)
+            self._settle(channel, start, end)
+            self._write()
+
+    def _snapshot(self):
+        # Copies of the entries, so readers never see a half-made update.
+        with self._lock:
+            return [dict(entry) for entry in self.entries.values()]
+
+    def _done_windows(self, channel, entries):
+        return sorted(
+            (
+                datetime.strptime(entry["start"], _TIME_FORMAT),
+                datetime.strptime(entry["end"], _TIME_FORMAT),
+            )
+            for entry in entries
+            if entry["channel"] == channel and entry["status"] == DONE
+        )
+
+    def missing(self, channel, start, end):
+        """Parts of ``[start, end)`` not covered by a done window of ``channel``.
+
+        Returned as a list of ``(gap_start, gap_end)``, oldest first.
+        """
+        return self._missing(channel, start, end, self._snapshot())
+
+    def _missing(self, channel, start, end, entries):
+        gaps = []
+        current = start
+        for window_start, window_end in self._done_windows(channel, entries):
+            if window_end <= current:
+                continue
+            if window_start >= end:
+                break
+            if window_start > current:
+                gaps.append((current, window_start))
+            current = max(current, window_end)
+        if current < end:
+            gaps.append((current, end))
+        return gaps
+
+    def _unresolved(self, status):
+        entries = self._snapshot()
+        return [
+            entry
+            for entry in entries
+            if entry["status"] == status
+            and self._missing(
+                entry["channel"],
+                datetime.strptime(entry["start"], _TIME_FORMAT),
+                datetime.strptime(entry["end"], _TIME_FORMAT),
+                entries,
+            )
+        ]
+
+    def failed(self):
+        """Failed windows that no later done window has covered yet."""
+        return self._unresolved(FAILED)
+
+    def pending(self):
+        """Windows whose request never returned, e.g. after a crash."""
+        return self._unresolved(PENDING)
+
+    def read_chunks(self, channel, start=None, end=None):
+        """Yield the stored DataFrames of ``channel``'s done windows.
+
+        Only windows inside ``[start, end]`` are read, so chunks left over
+        from an earlier backfill over a different range are ignored.
+        """
+        for entry in sorted(self._snapshot(), key=lambda e: e["start"]):
+            if entry["channel"] != channel or entry["status"] != DONE:
+                continue
+            if not entry["path"]:
+                continue
+            window_start = datetime.strptime(entry["start"], _TIME_FORMAT)
+            window_end = datetime.strptime(entry["end"], _TIME_FORMAT)
+            if start is not None and window_start < start:
+                continue
+            if end is not None and window_end > end:
+                continue
+            yield pd.read_csv(
+                os.path.join(self.chunk_dir, entry["path"]),
+                parse_dates=["timestamp"],
+            )
+
+
+def backfill(
+    ledger, channel, fetch, start, end, on_error=None, **chunk_options
+):
+    """Fetch every part of ``[start, end)`` the ledger has no data for.
+
+    ``fetch(window_start, window_end)`` returns the entries of one window as
+    a DataFrame; windows are sized by ``adaptive_chunks`` (``chunk_options``
+    are passed on to it). A window whose request raises, or that is still
+    truncated at the smallest window size, is marked failed and skipped, so
+    the next run retries it. ``on_error(window_start,
+    window_end, error)`` is called for each such window.
+    """
+
+    def tracked_fetch(window_start, window_end):
+        ledger.mark_pending(channel, window_start, window_end)
+        return fetch(window_start, window_end)
+
+    for gap_start, gap_end in ledger.missing(channel, start, end):
+        current = gap_start
+        while current < gap_end:
+            chunks = adaptive_chunks(
+                tracked_fetch, current, gap_end, **chunk_options
+            )
+            while current < gap_end:
+                try:
+                    window_start, window_end, df = next(chunks)
+                except Exception as error:
+                    # Only a failed request carries its window; anything
+                    # else is not a chunk failure and is raised as is.
+                    window = getattr(error, "window", None)
+                    if window is None:
+                        raise
+                    ledger.mark_failed(channel, *window, error)
+                    if on_error is not None:
+                        on_error(*window, error)
+                    current = window[1]
+                    break
+                # Written to disk right away instead of kept in memory
+                ledger.mark_done(channel, window_start, window_end, df)
+                current = window_end
+
+
+def hourly_means(chunks, columns, time_col="timestamp"):
+    """Hourly means of ``columns`` over chunks in time order.
+
+    Only one chunk is in memory at a time: each is reduced to per-hour sums
+    and counts, which are merged and divided once at the end. Hour ``h``
+    covers ``[h, h + 1)``. ThingSpeak's ``end`` is inclusive, so an entry on
+    the boundary of two windows arrives in both; it is counted once.
+    Columns that no chunk has are left out.
+    """
+    sums = counts = None
+    present = set()
+    last = None
+    for chunk in chunks:
+        if last is not None:
+            chunk = chunk[chunk[time_col] > last]
+        if chunk.empty:
+            continue
+        last = chunk[time_col].max()
+        present.update(chunk.columns)
+        values = chunk.reindex(columns=columns)
+        grouped = values.groupby(chunk[time_col].dt.floor("h"))
+        if sums is None:
+            sums, counts = grouped.sum(), grouped.count()
+        else:
+            sums = sums.add(grouped.sum(), fill_value=0)
+            counts = counts.add(grouped.count(), fill_value=0)
+
+    columns = [col for col in columns if col in present]
+    if sums is None:
+        return pd.DataFrame(columns=[time_col] + columns)
+    means = sums[columns] / counts[columns].where(counts[columns] > 0)
+    return means.rename_axis(time_col).reset_index()
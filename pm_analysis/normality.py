@@ -0,0 +1,311 @@
+"""Normality screening for every (sensor, pollutant, category) group.
+
+``screen`` runs the Kolmogorov-Smirnov, Anderson-Darling and Shapiro-Wilk
+tests for each group of a long DataFrame. K-S and Anderson-Darling are
+computed for all groups at once: the values are sorted within their group,
+standardised with the group mean and standard deviation, and compared to
+the normal CDF in single array operations. Shapiro-Wilk has no such closed
+form and is run per group.
+
+Results are cached by a hash of each group's values in one file at the
+repository root, so notebooks and scripts share them and unchanged groups
+are never recomputed.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+# scipy.stats.shapiro is only accurate up to this many samples; larger
+# groups are tested on a seeded random subsample of this size.
+SHAPIRO_MAX_N = 5000
+
+# Anderson-Darling 5% critical value for the normal distribution with
+# estimated mean and variance (D'Agostino & Stephens, 1986), corrected for
+# sample size as in scipy.stats.anderson.
+_ANDERSON_CRITICAL_5 = 0.752
+
+# Part of every cache key; bump it when the results of a test change so
+# entries computed by an older version are not reused.
+_CACHE_VERSION = 2
+
+# Shared by every caller regardless of the working directory.
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ".normality_cache.json",
+)
+
+_RESULT_KEYS = [
+    "n",
+    "mean",
+    "std",
+    "ks_stat",
+    "ks_p",
+    "anderson_stat",
+    "anderson_crit_5",
+    "shapiro_stat",
+    "shapiro_p",
+    "shapiro_n",
+]
+
+
+def _data_key(values, alpha, max_shapiro_n, seed):
+    # ``values`` must be sorted, so the key does not depend on row order.
+    digest = hashlib.sha1(values.tobytes())
+    digest.update(
+        f"{_CACHE_VERSION}:{alpha}:{max_shapiro_n}:{seed}".encode()
+    )
+    return digest.hexdigest()
+
+
+def _grouped_tests(values, groups, max_shapiro_n=SHAPIRO_MAX_N, seed=0):
+    """Run the three tests for every group at once.
+
+    ``values`` is sorted within each group and ``groups`` holds consecutive
+    group ids ``0..k-1`` in ascending order. Returns a dict of arrays of
+    length ``k``; groups with fewer than 3 values or zero variance get NaN.
+    """
+    n = np.bincount(groups)
+    k = len(n)
+    starts = np.concatenate([[0], np.cumsum(n)[:-1]])
+    rank = np.arange(len(values)) - starts[groups] + 1
+    n_each = n[groups]
+
+    # Same parametrisation as the kstest calls in data_analysis (sample
+    # mean, sample standard deviation) and as scipy.stats.anderson.
+    mean = np.bincount(groups, weights=values, minlength=k) / n
+    deviation = values - mean[groups]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        std = np.sqrt(
+            np.bincount(groups, weights=deviation**2, minlength=k) / (n - 1)
+        )
+        z = deviation / std[groups]
+    testable = (n >= 3) & (std > 0)
+
+    cdf = stats.norm.cdf(z)
+    d_plus = np.maximum.reduceat(rank / n_each - cdf, starts)
+    d_minus = np.maximum.reduceat(cdf - (rank - 1) / n_each, starts)
+    ks_stat = np.maximum(d_plus, d_minus)
+    ks_p = stats.kstwo.sf(ks_stat, n)
+
+    # A^2 = -n - 1/n * sum((2i - 1) * (ln F(z_i) + ln(1 - F(z_{n+1-i})))),
+    # with the second term regrouped so every element carries its own weight.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = (2 * rank - 1) * stats.norm.logcdf(z) + (
+            2 * (n_each - rank) + 1
+        ) * stats.norm.logsf(z)
+        anderson_stat = (
+            -n - np.bincount(groups, weights=terms, minlength=k) / n
+        )
+        anderson_crit = np.round(
+            _ANDERSON_CRITICAL_5 / (1.0 + 0.75 / n + 2.25 / n**2), 3
+        )
+
+    shapiro_stat = np.full(k, np.nan)
+    shapiro_p = np.full(k, np.nan)
+    shapiro_n = np.zeros(k, dtype=int)
+    for g in np.flatnonzero(testable):
+        sample = values[starts[g]:starts[g] + n[g]]
+        if n[g] > max_shapiro_n:
+            rng = np.random.default_rng(seed)
+            sample = rng.choice(sample, size=max_shapiro_n, replace=False)
+        result = stats.shapiro(sample)
+        shapiro_stat[g] = result.statistic
+        shapiro_p[g] = result.pvalue
+        shapiro_n[g] = len(sample)
+
+    def masked(array):
+        return np.where(testable, array, np.nan)
+
+    return {
+        "n": n,
+        "mean": np.where(n >= 3, mean, np.nan),
+        "std": np.where(n >= 3, std, np.nan),
+        "ks_stat": masked(ks_stat),
+        "ks_p": masked(ks_p),
+        "anderson_stat": masked(anderson_stat),
+        "anderson_crit_5": masked(anderson_crit),
+        "shapiro_stat": shapiro_stat,
+        "shapiro_p": shapiro_p,
+        "shapiro_n": shapiro_n,
+    }
+
+
+def normality_tests(values, alpha=0.05, max_shapiro_n=SHAPIRO_MAX_N, seed=0):
+    """Run the three normality tests on one array of values.
+
+    NaNs must already be removed. Returns a dict of statistics and
+    p-values; tests that need more samples than available are NaN.
+    """
+    values = np.sort(np.asarray(values, dtype=float))
+    if len(values) == 0:
+        return {
+            key: (0 if key in ("n", "shapiro_n") else np.nan)
+            for key in _RESULT_KEYS
+        }
+    groups = np.zeros(len(values), dtype=int)
+    result = _grouped_tests(values, groups, max_shapiro_n, seed)
+    return {key: result[key][0].item() for key in _RESULT_KEYS}
+
+
+def load_cache(path):
+    if path is None or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_cache(cache, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, path)
+
+
+def _to_cache(result):
+    # JSON has no NaN literal in strict mode; store None instead.
+    return {
+        key: (None if isinstance(value, float) and np.isnan(value) else value)
+        for key, value in result.items()
+    }
+
+
+def _from_cache(entry):
+    return {
+        key: (np.nan if value is None else value)
+        for key, value in entry.items()
+    }
+
+
+def _add_verdicts(result, alpha):
+    result["ks_normal"] = result["ks_p"] >= alpha
+    result["anderson_normal"] = (
+        result["anderson_stat"] < result["anderson_crit_5"]
+    )
+    result["shapiro_normal"] = result["shapiro_p"] >= alpha
+    return result
+
+
+def _screen_sorted(values, groups, k, cache, alpha, max_shapiro_n, seed):
+    # ``values`` sorted within ``groups`` (ids 0..k-1, ascending). Looks every
+    # group up in ``cache`` and tests the missing ones in one batch.
+    bounds = np.searchsorted(groups, np.arange(k + 1))
+    keys = [
+        _data_key(values[bounds[g]:bounds[g + 1]], alpha, max_shapiro_n, seed)
+        for g in range(k)
+    ]
+    results = [None] * k
+    todo = []
+    for g, key in enumerate(keys):
+        if key in cache:
+            results[g] = _from_cache(cache[key])
+        elif bounds[g] == bounds[g + 1]:
+            results[g] = normality_tests([], alpha, max_shapiro_n, seed)
+            cache[key] = _to_cache(results[g])
+        else:
+            todo.append(g)
+
+    if todo:
+        selected = np.isin(groups, todo)
+        # Relabel the groups to test as 0..len(todo)-1.
+        batch = _grouped_tests(
+            values[selected],
+            np.searchsorted(todo, groups[selected]),
+            max_shapiro_n,
+            seed,
+        )
+        for i, g in enumerate(todo):
+            results[g] = {key: batch[key][i].item() for key in _RESULT_KEYS}
+            cache[keys[g]] = _to_cache(results[g])
+
+    return [_add_verdicts(result, alpha) for result in results], bool(todo)
+
+
+def screen_series(
+    series,
+    cache_path=DEFAULT_CACHE_PATH,
+    alpha=0.05,
+    max_shapiro_n=SHAPIRO_MAX_N,
+    seed=0,
+):
+    """Normality tests for a single series, using the on-disk cache."""
+    cache = load_cache(cache_path)
+    values = np.sort(pd.Series(series).dropna().to_numpy(dtype=float))
+    groups = np.zeros(len(values), dtype=int)
+    (result,), computed = _screen_sorted(
+        values, groups, 1, cache, alpha, max_shapiro_n, seed
+    )
+    if computed and cache_path is not None:
+        save_cache(cache, cache_path)
+    return result
+
+
+def stack(frames, key="sensor"):
+    """Stack per-sensor DataFrames into one long frame with a ``key`` column.
+
+    ``frames`` maps sensor name to DataFrame, e.g. ``{"n1": n1_df, ...}``.
+    """
+    return pd.concat(
+        [df.assign(**{key: name}) for name, df in frames.items()],
+        ignore_index=True,
+    )
+
+
+def screen(
+    df,
+    value_cols=("pm25", "pm10"),
+    group_cols=("sensor", "frequency_category"),
+    cache_path=DEFAULT_CACHE_PATH,
+    alpha=0.05,
+    max_shapiro_n=SHAPIRO_MAX_N,
+    seed=0,
+):
+    """Screen every group of ``df`` and every column in ``value_cols``.
+
+    Returns one row per (group, pollutant) with the sample size, the test
+    statistics and p-values, and a boolean verdict per test at ``alpha``.
+    Pass ``cache_path=None`` to disable the on-disk cache.
+    """
+    group_cols = list(group_cols)
+    value_cols = list(value_cols)
+    long = df[group_cols + value_cols].melt(
+        id_vars=group_cols,
+        value_vars=value_cols,
+        var_name="pollutant",
+        value_name="value",
+    )
+    long["pollutant"] = pd.Categorical(
+        long["pollutant"], categories=value_cols
+    )
+
+    grouped = long.groupby(
+        group_cols + ["pollutant"], sort=True, dropna=False, observed=True
+    )
+    group_ids = grouped.ngroup().to_numpy()
+    labels = grouped.size().index.to_frame(index=False)
+
+    values = long["value"].to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    values = values[valid]
+    groups = group_ids[valid]
+    order = np.lexsort((values, groups))
+
+    cache = load_cache(cache_path)
+    results, computed = _screen_sorted(
+        values[order],
+        groups[order],
+        len(labels),
+        cache,
+        alpha,
+        max_shapiro_n,
+        seed,
+    )
+    if computed and cache_path is not None:
+        save_cache(cache, cache_path)
+
+    labels["pollutant"] = labels["pollutant"].astype(str)
+    return pd.concat([labels, pd.DataFrame(results)], axis=1)